@@ -1,16 +1,25 @@
+import heapq
 import html
 import itertools
 import json
 import os
+import random
 import re
+import sqlite3
 import time
 import uuid
 from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from difflib import SequenceMatcher
-from typing import Any, Dict, List, Optional, Tuple
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
 
 import requests
 from documentcloud.addon import AddOn
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ---- Config ----
 ADDON_VERSION = "0.1.0"
@@ -20,10 +29,30 @@ API_BASE = os.environ.get("DOCUMENTCLOUD_API_BASE", "https://api.www.documentclo
 METRICS_ENDPOINT = os.environ.get("ENTITY_BRIEF_METRICS_ENDPOINT")  # e.g. https://example.com/api/metrics
 FEEDBACK_URL = os.environ.get("ENTITY_BRIEF_FEEDBACK_URL", "")
 DEVELOPER_EMAIL = os.environ.get("ENTITY_BRIEF_DEV_EMAIL", "summerxie966@gmail.com")
+# Optional sqlite file that keeps entity responses between local runs (unset = no cache);
+# resolved at import so the demo script's chdir into the output dir doesn't move it.
+_CACHE_PATH_ENV = os.environ.get("ENTITY_BRIEF_CACHE_PATH", "").strip()
+ENTITY_CACHE_PATH = os.path.abspath(os.path.expanduser(_CACHE_PATH_ENV)) if _CACHE_PATH_ENV else ""
+# Seconds a cached entry stays valid (ENTITY_BRIEF_CACHE_TTL, default one day)
+_CACHE_TTL_ENV = os.environ.get("ENTITY_BRIEF_CACHE_TTL", "").strip()
+ENTITY_CACHE_TTL = int(_CACHE_TTL_ENV) if _CACHE_TTL_ENV.isdigit() else 86400
 ENTITY_COVERAGE_WARN_THRESHOLD = 0.4
 DUPE_SUGGESTIONS_LIMIT = 20
 DUPE_POOL_LIMIT = 200
 WRITEBACK_TAG_LIMIT_DEFAULT = 5
+# Throttling/gateway responses are retried with exponential backoff plus jitter so
+# concurrent fetches don't retry in lockstep.
+RETRY_STATUSES = (429, 502, 503, 504)
+RETRY_BACKOFF_BASE = 0.5
+# Entity fetches are network-bound; fetch this many documents at once
+# (ENTITY_BRIEF_FETCH_WORKERS overrides the default of 8).
+_FETCH_WORKERS_ENV = os.environ.get("ENTITY_BRIEF_FETCH_WORKERS", "").strip()
+FETCH_WORKERS = max(int(_FETCH_WORKERS_ENV), 1) if _FETCH_WORKERS_ENV.isdigit() else 8
+# DocumentCloud caps list endpoints at 100 rows per page (default 25).
+ENTITY_PAGE_SIZE = 100
+# Once page 1 gives the total, a document's remaining pages are fetched this many at a time
+# (never more than FETCH_WORKERS, so ENTITY_BRIEF_FETCH_WORKERS=1 fetches serially).
+PAGE_FETCH_WORKERS = min(4, FETCH_WORKERS)
 
 KIND_ALIASES = {
     "person": "Person",
@@ -40,6 +69,36 @@ KIND_ALIASES = {
 PERSON_PREFIXES = {"mr", "mrs", "ms", "dr", "prof", "hon", "sir", "madam"}
 PERSON_SUFFIXES = {"jr", "sr", "ii", "iii", "iv"}
 ORG_SUFFIXES = {"inc", "incorporated", "llc", "ltd", "limited", "co", "company", "corp", "corporation", "plc"}
+# Fields read from entity rows; everything else is dropped as pages arrive.
+ENTITY_FIELDS = ("kind", "value", "name", "mid", "knowledge_graph_mid", "wikidata_id", "wiki_url", "wikipedia_url")
+OCCURRENCE_FIELDS = ("page", "context", "snippet", "content")
+# Dots are dropped so initials collapse ("F.B.I." -> "fbi"); quotes, smart or not,
+# are spaced out by _PUNCT_RE and need no mapping first.
+_NAME_TRANSLATE = str.maketrans({".": None})
+_PUNCT_RE = re.compile(r"[^\w\s&]")
+_ALNUM_RUN_RE = re.compile(r"[A-Za-z0-9]+")
+_NON_ALNUM_RE = re.compile(r"[^A-Za-z0-9]")
+# Distinct (kind, surface name) keys remembered by _surface_key.
+ENTITY_KEY_CACHE_SIZE = 65536
+# Keep "</script>", "<!--" and entity-like text inert inside the embedded JSON
+# while leaving it valid JSON for JSON.parse().
+_JSON_SCRIPT_ESCAPES = str.maketrans({"<": "\\u003c", ">": "\\u003e", "&": "\\u0026"})
+
+
+# Shared across fetch workers so keep-alive connections are reused.
+# The pool holds one connection per in-flight request (doc workers x page workers);
+# extra ones would be discarded.
+# The adapter retries dropped/refused connections only; HTTP status retries
+# (429/5xx with Retry-After) stay in _api_get.
+# Mounted for http:// too so a local DOCUMENTCLOUD_API_BASE gets the same pool/retries.
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=1,  # every call goes to the one API host
+    pool_maxsize=FETCH_WORKERS * PAGE_FETCH_WORKERS,
+    max_retries=Retry(total=3, connect=3, read=2, status=0, backoff_factor=0.3, raise_on_status=False),
+)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
 
 
 # ---- Helpers ----
@@ -61,7 +120,17 @@ def _get_access_token(addon: AddOn) -> str:
     """
     DocumentCloud API uses an access token placed in Authorization: Bearer <token>.
     This function tries common locations that AddOn implementations tend to store it.
+    The first hit is remembered on the add-on so later calls return the same token.
     """
+    tok = getattr(addon, "_cached_token", None)
+    if tok:
+        return tok
+    tok = _find_access_token(addon)
+    addon._cached_token = tok
+    return tok
+
+
+def _find_access_token(addon: AddOn) -> str:
     for attr in ("access_token", "token"):
         tok = getattr(addon, attr, None)
         if tok:
@@ -79,56 +148,194 @@ def _get_access_token(addon: AddOn) -> str:
     raise RuntimeError("Could not locate a DocumentCloud access token.")
 
 
-def _api_get(url: str, token: str, params: Optional[Dict[str, Any]] = None, timeout: int = 30,
+def _set_api_token(token: str) -> None:
+    # Set once per run; every request on the shared session then carries it.
+    _SESSION.headers["Authorization"] = f"Bearer {token}"
+
+
+def _api_get(url: str, params: Optional[Dict[str, Any]] = None, timeout: int = 30,
              max_retries: int = 3) -> requests.Response:
-    headers = {"Authorization": f"Bearer {token}"}
     for attempt in range(max_retries + 1):
-        resp = requests.get(url, headers=headers, params=params or {}, timeout=timeout)
-        if resp.status_code == 429 and attempt < max_retries:
-            retry_after = _safe_int(resp.headers.get("Retry-After"), 1)
-            time.sleep(max(retry_after, 1))
+        resp = _SESSION.get(url, params=params or {}, timeout=timeout)
+        if resp.status_code in RETRY_STATUSES and attempt < max_retries:
+            retry_after = _safe_int(resp.headers.get("Retry-After"), 0)
+            delay = max(retry_after, RETRY_BACKOFF_BASE * 2 ** attempt)
+            time.sleep(delay + random.uniform(0, RETRY_BACKOFF_BASE))
             continue
         return resp
     return resp
 
 
-def _api_get_json(url: str, token: str, params: Optional[Dict[str, Any]] = None, timeout: int = 30) -> Dict[str, Any]:
-    resp = _api_get(url, token, params=params, timeout=timeout)
+def _api_get_json(url: str, params: Optional[Dict[str, Any]] = None, timeout: int = 30) -> Dict[str, Any]:
+    resp = _api_get(url, params=params, timeout=timeout)
     resp.raise_for_status()
-    return resp.json()
+    # Decode the raw bytes with the stdlib C decoder (JSON is UTF-8); resp.json()
+    # would first guess the charset and may route through simplejson if installed.
+    return json.loads(resp.content)
 
 
 def _api_get_all_pages(
     url: str,
-    token: str,
     params: Optional[Dict[str, Any]] = None,
     first_payload: Optional[Any] = None,
+    transform: Optional[Callable[[Any], Any]] = None,
 ) -> List[Dict[str, Any]]:
     """
     Handle DRF-style pagination: {results: [...], next: url}
+    transform (optional) is applied to each row as its page arrives.
+    When page 1 reports a count and a page-numbered next link, the remaining
+    pages are requested concurrently (results stay in page order).
     """
     out: List[Dict[str, Any]] = []
     payload = first_payload
     next_url = url
     next_params = dict(params or {})
     if payload is None:
-        payload = _api_get_json(next_url, token, params=next_params)
+        payload = _api_get_json(next_url, params=next_params)
+    first_page = True
     while True:
         if isinstance(payload, dict) and "results" in payload:
-            out.extend(payload.get("results", []))
+            results = payload.get("results", [])
+            out.extend(map(transform, results) if transform else results)
+            page_size = len(results)
             next_url = payload.get("next")
-            next_params = {}  # next already includes query params
+            count = payload.get("count")
+            # Drop this page's full rows before the next page is fetched and parsed.
+            payload = results = None
+            next_params = {}  # next already includes query params (per_page too)
             if not next_url:
                 break
-            payload = _api_get_json(next_url, token, params=next_params)
+            if first_page:
+                first_page = False
+                rest = _remaining_page_urls(next_url, count, page_size)
+                if len(rest) > 1:
+                    with ThreadPoolExecutor(max_workers=min(len(rest), PAGE_FETCH_WORKERS)) as pool:
+                        for page in pool.map(_api_get_json, rest):
+                            rows = page.get("results", []) if isinstance(page, dict) else []
+                            out.extend(map(transform, rows) if transform else rows)
+                    break
+            payload = _api_get_json(next_url, params=next_params)
         elif isinstance(payload, list):
-            out.extend(payload)
+            out.extend(map(transform, payload) if transform else payload)
             break
         else:
             break
     return out
 
 
+def _remaining_page_urls(next_url: str, count: Any, page_size: int) -> List[str]:
+    """
+    Build the page=2..N urls from page 1's next link and total count.
+    Returns [] for cursor-style or otherwise unrecognized pagination.
+    """
+    if not isinstance(count, int) or page_size <= 0:
+        return []
+    parts = urlsplit(next_url)
+    query = parse_qs(parts.query, keep_blank_values=True)
+    if query.get("page") != ["2"]:
+        return []
+    urls = []
+    for page in range(2, -(-count // page_size) + 1):
+        query["page"] = [str(page)]
+        urls.append(urlunsplit(parts._replace(query=urlencode(query, doseq=True))))
+    return urls
+
+
+def _slim_entity(ent: Any) -> Any:
+    """
+    Keep only the fields the report reads so a run doesn't hold full API rows
+    (offsets, relevance, descriptions) for every document until clustering.
+    Malformed rows pass through unchanged and are skipped during aggregation.
+    """
+    if not isinstance(ent, dict):
+        return ent
+    slim = {k: ent[k] for k in ("count", "mentions") if k in ent}
+    payload = ent.get("entity")
+    if isinstance(payload, dict):
+        slim["entity"] = {k: payload[k] for k in ENTITY_FIELDS if k in payload}
+    else:
+        slim.update({k: ent[k] for k in ENTITY_FIELDS if k in ent})
+    occs = ent.get("occurrences")
+    if isinstance(occs, list):
+        slim["occurrences"] = [
+            {k: occ[k] for k in OCCURRENCE_FIELDS if k in occ} if isinstance(occ, dict) else occ
+            for occ in occs
+        ]
+    elif occs is not None:
+        slim["occurrences"] = occs
+    return slim
+
+
+def _fetch_doc_entities(doc_id: int, min_rel: float) -> Tuple[Optional[List[Dict[str, Any]]], str]:
+    """
+    Fetch every entity for one document.
+    Returns (entities, "") or (None, skip_reason) when the doc has no entities.
+    """
+    url = f"{API_BASE}documents/{doc_id}/entities/"
+    params = {
+        "expand": "entity,occurrences",
+        "relevance__gt": min_rel,
+        "per_page": ENTITY_PAGE_SIZE,
+    }
+    try:
+        # Let the pager fetch page 1 too, so no raw response or full page tree
+        # stays referenced here while the remaining pages are fetched.
+        ents = _api_get_all_pages(url, params=params, transform=_slim_entity)
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None, "no entities (404)"
+        raise
+    if not ents:
+        return None, "no entities"
+    return ents, ""
+
+
+def _open_entity_cache(path: str) -> Optional[sqlite3.Connection]:
+    if not path:
+        return None
+    try:
+        db = sqlite3.connect(path)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS ents ("
+            "doc_id INTEGER, min_rel REAL, updated TEXT, stored REAL, payload TEXT, "
+            "PRIMARY KEY (doc_id, min_rel))"
+        )
+        return db
+    except sqlite3.Error:
+        return None
+
+
+def _cache_get(db: sqlite3.Connection, doc_id: int, min_rel: float, updated: str) -> Optional[str]:
+    """
+    Return the cached entities' JSON text only if the document has not changed since
+    they were stored and the entry is younger than ENTITY_CACHE_TTL (entities can be
+    re-extracted without touching updated_at). Callers decode it when the doc is
+    aggregated, so hits don't all sit in memory as parsed rows.
+    """
+    if not updated:
+        return None
+    try:
+        row = db.execute("SELECT payload, updated, stored FROM ents WHERE doc_id = ? AND min_rel = ?",
+                         (doc_id, min_rel)).fetchone()
+        if row and row[1] == updated and time.time() - (row[2] or 0) < ENTITY_CACHE_TTL:
+            return row[0]
+    except sqlite3.Error:
+        pass
+    return None
+
+
+def _cache_put(db: sqlite3.Connection, doc_id: int, min_rel: float, updated: str,
+               ents: List[Dict[str, Any]]) -> None:
+    if not updated:
+        return
+    try:
+        db.execute("INSERT OR REPLACE INTO ents (doc_id, min_rel, updated, stored, payload) "
+                   "VALUES (?, ?, ?, ?, ?)",
+                   (doc_id, min_rel, updated, time.time(), json.dumps(ents, separators=(",", ":"))))
+    except sqlite3.Error:
+        pass
+
+
 def _normalize_kind(kind: str) -> str:
     kind = (kind or "").strip()
     if not kind:
@@ -154,12 +361,9 @@ def _strip_org_suffixes(tokens: List[str]) -> List[str]:
 def _normalize_name(s: str, kind: str = "") -> str:
     if not s:
         return ""
-    s = s.strip().lower()
-    s = s.replace("\u201c", '"').replace("\u201d", '"').replace("\u2019", "'")
-    s = s.replace(".", "")
-    s = re.sub(r"[^\w\s&]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    tokens = s.split()
+    s = s.strip().lower().translate(_NAME_TRANSLATE)
+    # split() with no argument collapses whitespace runs and trims the ends.
+    tokens = _PUNCT_RE.sub(" ", s).split()
     if kind:
         kind_norm = kind.lower()
         if kind_norm in ("person", "people"):
@@ -170,7 +374,7 @@ def _normalize_name(s: str, kind: str = "") -> str:
 
 
 def _name_acronym(name: str) -> str:
-    tokens = re.findall(r"[A-Za-z0-9]+", name or "")
+    tokens = _ALNUM_RUN_RE.findall(name or "")
     letters = [t[0] for t in tokens if t and not t.isdigit()]
     return "".join(letters).upper()
 
@@ -178,7 +382,7 @@ def _name_acronym(name: str) -> str:
 def _is_acronym_name(name: str) -> bool:
     if not name:
         return False
-    cleaned = re.sub(r"[^A-Za-z0-9]", "", name)
+    cleaned = _NON_ALNUM_RE.sub("", name)
     if not cleaned or len(cleaned) > 6:
         return False
     return cleaned.isupper()
@@ -190,18 +394,26 @@ def _entity_key(ent: Dict[str, Any]) -> Tuple[str, str]:
     - Prefer stable IDs if present (mid/wiki_url)
     - Else normalized surface form with kind-aware cleanup
     """
-    kind = _normalize_kind(str(ent.get("kind", "Other")))
-    # Common fields from entity systems (may/may not exist depending on extractor)
-    mid = ent.get("mid") or ent.get("knowledge_graph_mid")
-    wikidata = ent.get("wikidata_id")
-    wiki = ent.get("wiki_url") or ent.get("wikipedia_url")
+    get = ent.get
+    kind = _normalize_kind(str(get("kind", "Other")))
+    # Common fields from entity systems (may/may not exist depending on extractor);
+    # checked in priority order so later lookups are skipped once one resolves.
+    mid = get("mid") or get("knowledge_graph_mid")
     if mid:
         return (kind, f"mid:{mid}")
+    wikidata = get("wikidata_id")
     if wikidata:
         return (kind, f"wikidata:{wikidata}")
+    wiki = get("wiki_url") or get("wikipedia_url")
     if wiki:
         return (kind, f"wiki:{wiki}")
-    val = str(ent.get("value") or ent.get("name") or "")
+    return _surface_key(kind, str(get("value") or get("name") or ""))
+
+
+@lru_cache(maxsize=ENTITY_KEY_CACHE_SIZE)
+def _surface_key(kind: str, val: str) -> Tuple[str, str]:
+    # The same names recur across documents; memoizing skips re-normalizing them
+    # and hands back one shared key tuple per (kind, name).
     return (kind, f"v:{_normalize_name(val, kind)}")
 
 
@@ -279,6 +491,92 @@ def _find_possible_duplicates(entities: List[Dict[str, Any]], min_ratio: float =
     return suggestions
 
 
+def _ingest_doc_entities(
+    doc_id: int,
+    ents: List[Dict[str, Any]],
+    clusters: Dict[Tuple[str, str], Dict[str, Any]],
+    track_pages: bool,
+) -> Tuple[Dict[Tuple[str, str], None], Dict[int, set]]:
+    """
+    Fold one document's entity rows into the cross-doc clusters.
+    Returns the doc's canonical keys (unique, first-seen order) and, when
+    track_pages is set, its page -> keys index for co-occurrence.
+    Malformed rows are skipped.
+    """
+    keys_for_doc: Dict[Tuple[str, str], None] = {}
+    page_entities: Dict[int, set] = defaultdict(set)
+    for ent in ents:
+        try:
+            payload = _entity_payload(ent)
+            display = _entity_display(payload)
+            if not display:
+                continue
+
+            # key[0] is the normalized kind
+            key = _entity_key(payload)
+            keys_for_doc[key] = None
+
+            c = clusters.get(key)
+            if c is None:
+                c = clusters[key] = {
+                    "kind": key[0],
+                    "canonical_key": f"{key[0]}::{key[1]}",
+                    "display_names": {},  # surface form -> count; keys are the aliases
+                    "total_mentions": 0,
+                    "docs": {},  # doc_id -> {count, pages:set, samples:[]}; doc_count = len()
+                }
+
+            names = c["display_names"]
+            names[display] = names.get(display, 0) + 1
+
+            get = ent.get
+            count = int(get("count") or get("mentions") or 0)
+            occs = get("occurrences") or []
+            if not count and occs:
+                count = len(occs)
+            c["total_mentions"] += count
+
+            c_docs = c["docs"]
+            dd = c_docs.get(doc_id)
+            if dd is None:
+                dd = c_docs[doc_id] = {"count": 0, "pages": set(), "samples": []}
+
+            dd["count"] += count
+
+            # Occurrences may include page/context; best-effort
+            pages = dd["pages"]
+            if track_pages:
+                for occ in occs:
+                    page = occ.get("page")
+                    if isinstance(page, int):
+                        pages.add(page)
+                        page_entities[page].add(key)
+            else:
+                # Receipts still list pages; only the co-occurrence index is skipped.
+                for occ in occs:
+                    page = occ.get("page")
+                    if isinstance(page, int):
+                        pages.add(page)
+            # Only the first 5 distinct samples per doc are reported; stop collecting once
+            # full. Repeated boilerplate is skipped (a scan of <= 5 items beats a hash set).
+            samples = dd["samples"]
+            if len(samples) < 5:
+                for occ in itertools.islice(occs, 5):
+                    snippet = occ.get("context") or occ.get("snippet") or occ.get("content") or ""
+                    if snippet:
+                        snippet = str(snippet)[:200]
+                        if snippet in samples:
+                            continue
+                        samples.append(snippet)
+                        if len(samples) >= 5:
+                            break
+
+        except Exception:
+            continue
+
+    return keys_for_doc, page_entities
+
+
 def _apply_tag_prefix(prefix: str, name: str) -> str:
     prefix = (prefix or "").strip()
     if not prefix:
@@ -286,6 +584,10 @@ def _apply_tag_prefix(prefix: str, name: str) -> str:
     return f"{prefix}{name}"
 
 
+def _doc_stub(did: int) -> Dict[str, Any]:
+    return {"id": did, "title": f"Document {did}", "url": "", "page_count": 0}
+
+
 class EntityBrief(AddOn):
     def main(self):
         start_ts = time.time()
@@ -303,234 +605,220 @@ class EntityBrief(AddOn):
         writeback_tag_limit = max(writeback_tag_limit, 0)
         writeback_tag_prefix = str(data.get("writeback_tag_prefix", "entity:") or "entity:").strip()
 
-        # ---- Fetch docs ----
-        self.set_message("Collecting documents...")
+        # ---- Fetch docs and their entities ----
+        # Each document's entity fetch is submitted as soon as its metadata is read,
+        # so fetching overlaps the (paged) document listing.
+        self.set_message("Collecting documents and fetching entities...")
+        _set_api_token(_get_access_token(self))
         doc_iter = self.get_documents()
         if max_docs:
             doc_iter = itertools.islice(doc_iter, max_docs)
-        docs = list(doc_iter)
+        docs = []
 
         doc_meta: Dict[int, Dict[str, Any]] = {}
         total_pages = 0
-
-        for i, doc in enumerate(docs, start=1):
-            doc_id = int(getattr(doc, "id"))
-            title = str(getattr(doc, "title", "")) or f"Document {doc_id}"
-            canonical_url = str(getattr(doc, "canonical_url", ""))
-            page_count = int(getattr(doc, "page_count", 0) or 0)
-            doc_data = getattr(doc, "data", None)
-            if not isinstance(doc_data, dict):
-                doc_data = {}
-            total_pages += page_count
-
-            doc_meta[doc_id] = {
-                "id": doc_id,
-                "title": title,
-                "url": canonical_url,
-                "page_count": page_count,
-                "data": doc_data,
-            }
-
-            self.set_progress(int(i / max(len(docs), 1) * 10))
-
-        self.set_message(f"Collected {len(docs)} documents.")
-
-        # ---- Extract entities per doc ----
-        token = _get_access_token(self)
-        self.set_message(f"Fetching entities for {len(docs)} documents...")
-        doc_entities: Dict[int, List[Dict[str, Any]]] = {}
         failures: List[Dict[str, Any]] = []
         skipped: List[Dict[str, Any]] = []
+        # set_progress() is a round trip to the add-on host; only send changed values.
+        last_pct = -1
 
-        for i, doc in enumerate(docs, start=1):
-            doc_id = getattr(doc, "id", None)
-            try:
-                doc_id = int(doc_id)
-                url = f"{API_BASE}documents/{doc_id}/entities/"
-                params = {
-                    "expand": "entity,occurrences",
-                    "relevance__gt": min_rel,
-                }
-                resp = _api_get(url, token, params=params)
-                if resp.status_code == 404:
-                    meta = doc_meta.get(doc_id, {"id": doc_id, "title": f"Document {doc_id}", "url": ""})
-                    skipped.append({
-                        "doc_id": doc_id,
-                        "title": meta["title"],
-                        "url": meta["url"],
-                        "reason": "no entities (404)",
-                    })
-                    continue
-                resp.raise_for_status()
-                ents = _api_get_all_pages(url, token, params=params, first_payload=resp.json())
-                if not ents:
-                    meta = doc_meta.get(doc_id, {"id": doc_id, "title": f"Document {doc_id}", "url": ""})
-                    skipped.append({
-                        "doc_id": doc_id,
-                        "title": meta["title"],
-                        "url": meta["url"],
-                        "reason": "no entities",
-                    })
-                    continue
-                doc_entities[doc_id] = ents
-            except Exception as e:
-                failures.append({"doc_id": doc_id, "error": str(e)})
-            finally:
-                self.set_progress(10 + int(i / max(len(docs), 1) * 30))
-
-        # ---- Build cross-doc clusters ----
-        self.set_message("Normalizing and aggregating entities...")
+        cache = _open_entity_cache(ENTITY_CACHE_PATH)
+        cached: Dict[int, str] = {}
+        futures = {}
+
+        # ---- Build cross-doc clusters (as each doc's entities arrive) ----
         clusters: Dict[Tuple[str, str], Dict[str, Any]] = {}
-        # Per-doc canonical set for co-occurrence
-        doc_entity_keys: Dict[int, List[Tuple[str, str]]] = {}
+        # Per-doc canonical keys for co-occurrence, deduplicated in first-seen order
+        doc_entity_keys: Dict[int, Dict[Tuple[str, str], None]] = {}
         doc_page_entities: Dict[int, Dict[int, set]] = {}
+        entity_doc_ids: set = set()
+
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+            for doc in doc_iter:
+                docs.append(doc)
+                doc_id = int(getattr(doc, "id"))
+                title = str(getattr(doc, "title", "")) or f"Document {doc_id}"
+                canonical_url = str(getattr(doc, "canonical_url", ""))
+                page_count = int(getattr(doc, "page_count", 0) or 0)
+                updated_at = str(getattr(doc, "updated_at", "") or "")
+                doc_data = getattr(doc, "data", None)
+                if not isinstance(doc_data, dict):
+                    doc_data = {}
+                total_pages += page_count
+
+                doc_meta[doc_id] = {
+                    "id": doc_id,
+                    "title": title,
+                    "url": canonical_url,
+                    "page_count": page_count,
+                    "updated_at": updated_at,
+                    "data": doc_data,
+                }
 
-        for doc_id, ents in doc_entities.items():
-            keys_for_doc = []
-            page_entities: Dict[int, set] = {}
-            for ent in ents:
-                try:
-                    payload = _entity_payload(ent)
-                    kind = _normalize_kind(str(payload.get("kind", "Other")))
-                    display = _entity_display(payload)
-                    if not display:
+                if doc_id not in futures and doc_id not in cached:
+                    hit = _cache_get(cache, doc_id, min_rel, updated_at) if cache else None
+                    if hit:
+                        cached[doc_id] = hit
+                    else:
+                        futures[doc_id] = pool.submit(_fetch_doc_entities, doc_id, min_rel)
+
+                if max_docs:
+                    pct = int(len(docs) / max_docs * 10)
+                    if pct != last_pct:
+                        self.set_progress(pct)
+                        last_pct = pct
+
+            self.set_message(f"Collected {len(docs)} documents; fetching and aggregating entities...")
+            # Fold each doc into the clusters as soon as its fetch is done, in document
+            # order so the report does not depend on completion order. Aggregation overlaps
+            # the fetches still in flight, and each doc's rows are dropped once folded in.
+            for done, doc_id in enumerate(doc_meta):
+                pct = 10 + int(done / len(doc_meta) * 30)
+                if pct != last_pct:
+                    self.set_progress(pct)
+                    last_pct = pct
+
+                ents = None
+                if doc_id in cached:
+                    try:
+                        ents = json.loads(cached.pop(doc_id))
+                    except ValueError:
+                        # Unreadable cache entry: fetch it after all.
+                        futures[doc_id] = pool.submit(_fetch_doc_entities, doc_id, min_rel)
+                if ents is None:
+                    try:
+                        ents, reason = futures.pop(doc_id).result()
+                    except Exception as e:
+                        failures.append({"doc_id": doc_id, "error": str(e)})
+                        continue
+                    if ents is None:
+                        meta = doc_meta[doc_id]
+                        skipped.append({
+                            "doc_id": doc_id,
+                            "title": meta["title"],
+                            "url": meta["url"],
+                            "reason": reason,
+                        })
                         continue
+                    if cache:
+                        _cache_put(cache, doc_id, min_rel, doc_meta[doc_id]["updated_at"], ents)
 
-                    key = _entity_key(payload)
-                    keys_for_doc.append(key)
-
-                    c = clusters.get(key)
-                    if not c:
-                        clusters[key] = {
-                            "kind": kind,
-                            "canonical_key": f"{key[0]}::{key[1]}",
-                            "display_names": Counter(),
-                            "aliases": set(),
-                            "total_mentions": 0,
-                            "doc_count": 0,
-                            "docs": {},  # doc_id -> {count, pages:set, samples:[]}
-                        }
-                        c = clusters[key]
-
-                    c["display_names"][display] += 1
-                    c["aliases"].add(display)
-
-                    count = int(ent.get("count") or ent.get("mentions") or 0)
-                    occs = ent.get("occurrences") or []
-                    if not count and occs:
-                        count = len(occs)
-                    c["total_mentions"] += count
-
-                    if doc_id not in c["docs"]:
-                        c["docs"][doc_id] = {"count": 0, "pages": set(), "samples": []}
-                        c["doc_count"] += 1
-
-                    c["docs"][doc_id]["count"] += count
-
-                    # Occurrences may include page/context; best-effort
-                    pages_for_ent = set()
-                    for occ in occs:
-                        page = occ.get("page")
-                        if isinstance(page, int):
-                            pages_for_ent.add(page)
-                            page_entities.setdefault(page, set()).add(key)
-                    if pages_for_ent:
-                        c["docs"][doc_id]["pages"].update(pages_for_ent)
-                    for occ in occs[:5]:
-                        page = occ.get("page")
-                        snippet = occ.get("context") or occ.get("snippet") or occ.get("content") or ""
-                        if snippet:
-                            c["docs"][doc_id]["samples"].append(str(snippet)[:200])
-
-                except Exception:
-                    continue
+                entity_doc_ids.add(doc_id)
+                keys_for_doc, page_entities = _ingest_doc_entities(doc_id, ents, clusters, include_connections)
+                # A doc with a single entity can't contribute a pair; don't keep it around.
+                if include_connections and len(keys_for_doc) > 1:
+                    doc_entity_keys[doc_id] = keys_for_doc
+                if page_entities:
+                    doc_page_entities[doc_id] = page_entities
 
-            doc_entity_keys[doc_id] = keys_for_doc
-            if page_entities:
-                doc_page_entities[doc_id] = page_entities
+        if cache:
+            cache.commit()
+            cache.close()
 
         # Finalize cluster display name and build per-doc rollups
         cluster_list: List[Dict[str, Any]] = []
         doc_entities_by_doc: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
         for key, c in clusters.items():
-            display = c["display_names"].most_common(1)[0][0] if c["display_names"] else key[1]
+            # max() keeps the first-seen name on ties.
+            display_counts = c.pop("display_names")
+            display = max(display_counts.items(), key=itemgetter(1))[0] if display_counts else key[1]
             c["display"] = display
-            # JSON-ify sets/counters
-            docs_out = []
+            kind = c["kind"]
             for did, dd in c["docs"].items():
-                meta = doc_meta.get(did, {"id": did, "title": f"Document {did}", "url": ""})
                 doc_entities_by_doc[did].append({
                     "name": display,
-                    "kind": c["kind"],
-                    "count": dd["count"],
-                })
-                docs_out.append({
-                    "doc_id": did,
-                    "title": meta["title"],
-                    "url": meta["url"],
+                    "kind": kind,
                     "count": dd["count"],
-                    "pages": sorted(list(dd["pages"]))[:25],
-                    "samples": dd["samples"][:5],
                 })
-            docs_out.sort(key=lambda x: (-x["count"], x["title"]))
 
             cluster_list.append({
                 "key": c["canonical_key"],
-                "kind": c["kind"],
+                "kind": kind,
                 "name": display,
-                "aliases": sorted(list(c["aliases"]))[:25],
+                "aliases": display_counts,  # capped below for reported clusters
                 "total_mentions": c["total_mentions"],
-                "doc_count": c["doc_count"],
+                "doc_count": len(c["docs"]),
                 # Keep full per-doc coverage for "receipts" (doc/page refs).
                 # The overall run is already safety-capped via max_docs.
-                "docs": docs_out,
+                "docs": c["docs"],  # JSON-ified below for reported clusters
             })
 
-        cluster_list.sort(key=lambda x: (-x["doc_count"], -x["total_mentions"], x["name"].lower()))
+        # Only the head is reported (top entities, the 500-row index, the dupe pool),
+        # so pick it with a bounded heap; ties keep first-seen order.
+        unique_entity_count = len(cluster_list)
+        cluster_list = heapq.nsmallest(
+            max(top_n, 5, 500),
+            cluster_list,
+            key=lambda x: (-x["doc_count"], -x["total_mentions"], x["name"].lower()),
+        )
+
+        # Build aliases and per-doc receipts only for the clusters that made the cut.
+        for ent in cluster_list:
+            ent["aliases"] = heapq.nsmallest(25, ent["aliases"])
+            docs_out = []
+            for did, dd in ent["docs"].items():
+                meta = doc_meta.get(did) or _doc_stub(did)
+                docs_out.append({
+                    "doc_id": did,
+                    "title": meta["title"],
+                    "url": meta["url"],
+                    "count": dd["count"],
+                    "pages": heapq.nsmallest(25, dd["pages"]),
+                    "samples": dd["samples"],  # deduped and capped at 5 during aggregation
+                })
+            docs_out.sort(key=lambda x: (-x["count"], x["title"]))
+            ent["docs"] = docs_out
 
         # ---- Connections (co-occurrence) ----
         edges: List[Dict[str, Any]] = []
         if include_connections:
             self.set_message("Computing co-occurrence connections...")
-            pair_stats: Dict[Tuple[Tuple[str, str], Tuple[str, str]], Dict[str, Any]] = {}
+            pair_stats: Dict[Tuple[int, int], Dict[str, Any]] = {}
             any_page_data = False
-
-            def _display_name(key: Tuple[str, str]) -> str:
-                display = clusters.get(key, {}).get("display_names", Counter()).most_common(1)
-                return display[0][0] if display else key[1]
-
-            def _key_score(key: Tuple[str, str]) -> int:
-                return int(clusters.get(key, {}).get("total_mentions", 0))
+            # Pairs are counted on int ids so hashing is cheap.
+            # Ids are ranks in key order, so int pairs sort (and tie-break) like the keys.
+            id_to_key = sorted(clusters)
+            key_to_id = {k: i for i, k in enumerate(id_to_key)}
+            display_by_id = [clusters[k]["display"] or k[1] for k in id_to_key]
+            # Per-page/per-doc sort key: most mentioned first, then the key's repr for stable ties.
+            key_rank = {k: (-c["total_mentions"], str(k)) for k, c in clusters.items()}
 
             for did, page_map in doc_page_entities.items():
                 if not page_map:
                     continue
                 any_page_data = True
                 for page, keys in page_map.items():
-                    unique = sorted(set(keys), key=lambda k: (-_key_score(k), str(k)))
-                    unique = unique[:25]
-                    for a, b in itertools.combinations(sorted(unique), 2):
+                    if len(keys) < 2:
+                        continue
+                    # Top 25 by rank; ranks are unique, so ties can't reorder the pick.
+                    unique = heapq.nsmallest(25, keys, key=key_rank.__getitem__)
+                    for a, b in itertools.combinations(sorted(key_to_id[k] for k in unique), 2):
+                        # A pair occurs once per (doc, page) and docs arrive one at a time,
+                        # so pages is a plain count and docs only needs the last doc seen.
                         stat = pair_stats.get((a, b))
                         if not stat:
-                            stat = {"docs": set(), "pages": set(), "examples": []}
+                            stat = {"docs": 0, "pages": 0, "last_doc": None, "examples": []}
                             pair_stats[(a, b)] = stat
-                        stat["docs"].add(did)
-                        stat["pages"].add((did, page))
+                        if stat["last_doc"] != did:
+                            stat["last_doc"] = did
+                            stat["docs"] += 1
+                        stat["pages"] += 1
                         if len(stat["examples"]) < 3:
                             stat["examples"].append((did, page))
 
             if not any_page_data:
                 pair_counts = Counter()
                 for did, keys in doc_entity_keys.items():
-                    # Use only top entities per doc to avoid combinatorial blowup
-                    unique = list(dict.fromkeys(keys))  # stable unique
-                    unique = unique[:25]
-                    for a, b in itertools.combinations(sorted(unique), 2):
-                        pair_counts[(a, b)] += 1
-                for (a, b), dc in pair_counts.most_common(50):
+                    # Use only the 25 most mentioned entities per doc to avoid combinatorial
+                    # blowup, picked the same way as on the page path; keys are already unique.
+                    top = heapq.nsmallest(25, keys, key=key_rank.__getitem__)
+                    unique = sorted(key_to_id[k] for k in top)
+                    pair_counts.update(itertools.combinations(unique, 2))
+                for (ia, ib), dc in pair_counts.most_common(50):
+                    a, b = id_to_key[ia], id_to_key[ib]
                     edges.append({
-                        "a": _display_name(a),
-                        "b": _display_name(b),
+                        "a": display_by_id[ia],
+                        "b": display_by_id[ib],
                         "a_key": f"{a[0]}::{a[1]}",
                         "b_key": f"{b[0]}::{b[1]}",
                         "doc_count": dc,
@@ -538,10 +826,22 @@ class EntityBrief(AddOn):
                         "examples": [],
                     })
             else:
-                for (a, b), stat in pair_stats.items():
+                # Rank pairs on their stats and only build edge dicts for the top 50;
+                # ties keep first-seen order.
+                def _pair_rank(item: Tuple[Tuple[int, int], Dict[str, Any]]) -> Tuple[int, int, str, str]:
+                    (ia, ib), stat = item
+                    return (
+                        -stat["pages"],
+                        -stat["docs"],
+                        display_by_id[ia],
+                        display_by_id[ib],
+                    )
+
+                for (ia, ib), stat in heapq.nsmallest(50, pair_stats.items(), key=_pair_rank):
+                    a, b = id_to_key[ia], id_to_key[ib]
                     examples = []
                     for did, page in stat["examples"]:
-                        meta = doc_meta.get(did, {"id": did, "title": f"Document {did}", "url": ""})
+                        meta = doc_meta.get(did) or _doc_stub(did)
                         examples.append({
                             "doc_id": did,
                             "title": meta["title"],
@@ -549,16 +849,14 @@ class EntityBrief(AddOn):
                             "page": page,
                         })
                     edges.append({
-                        "a": _display_name(a),
-                        "b": _display_name(b),
+                        "a": display_by_id[ia],
+                        "b": display_by_id[ib],
                         "a_key": f"{a[0]}::{a[1]}",
                         "b_key": f"{b[0]}::{b[1]}",
-                        "doc_count": len(stat["docs"]),
-                        "page_count": len(stat["pages"]),
+                        "doc_count": stat["docs"],
+                        "page_count": stat["pages"],
                         "examples": examples,
                     })
-                edges.sort(key=lambda x: (-x.get("page_count", 0), -x.get("doc_count", 0), x["a"], x["b"]))
-                edges = edges[:50]
 
         # ---- Alias suggestions (heuristic) ----
         demo_mode = str(run_uuid).startswith("demo")
@@ -586,7 +884,7 @@ class EntityBrief(AddOn):
             limit = writeback_tag_limit if writeback_tag_limit > 0 else 0
             tags = [e["name"] for e in ent_list[:limit]] if limit else []
             tag_values = [_apply_tag_prefix(writeback_tag_prefix, t) for t in tags]
-            meta = doc_meta.get(did, {"id": did, "title": f"Document {did}", "url": ""})
+            meta = doc_meta.get(did) or _doc_stub(did)
             doc_tags.append({
                 "doc_id": did,
                 "title": meta["title"],
@@ -636,15 +934,15 @@ class EntityBrief(AddOn):
 
         # ---- Build report data ----
         runtime_s = round(time.time() - start_ts, 2)
-        docs_with_entities = len(doc_entities)
+        docs_with_entities = len(entity_doc_ids)
         entity_coverage = (docs_with_entities / len(docs)) if docs else 0
         skipped_map = {s.get("doc_id"): s.get("reason") for s in skipped}
         failure_map = {f.get("doc_id"): f.get("error") for f in failures}
         documents_out: List[Dict[str, Any]] = []
         for doc in docs:
             doc_id = int(getattr(doc, "id"))
-            meta = doc_meta.get(doc_id, {"id": doc_id, "title": f"Document {doc_id}", "url": "", "page_count": 0})
-            if doc_id in doc_entities:
+            meta = doc_meta.get(doc_id) or _doc_stub(doc_id)
+            if doc_id in entity_doc_ids:
                 status = "entities present"
                 reason = ""
             elif doc_id in failure_map:
@@ -675,7 +973,7 @@ class EntityBrief(AddOn):
                 "entity_coverage": round(entity_coverage, 3),
                 "entity_coverage_threshold": ENTITY_COVERAGE_WARN_THRESHOLD,
                 "pages_processed": total_pages,
-                "unique_entities": len(cluster_list),
+                "unique_entities": unique_entity_count,
                 "generated_at_epoch": int(time.time()),
             },
             "meta": {
@@ -695,21 +993,26 @@ class EntityBrief(AddOn):
 
         # ---- Render HTML ----
         self.set_message("Generating HTML report...")
-        html_report = self._render_html(report_data)
+        html_parts = self._render_html(report_data)
         filename = f"entity-brief-{run_uuid}.html"
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(html_report)
-
-        # Attach report to add-on run (one file per run)
-        with open(filename, "rb") as f:
+        # Attach report to add-on run (one file per run). upload_file() rewinds the
+        # handle and reads its .name/.mode, so write and upload through one binary handle.
+        with open(filename, "w+b") as f:
+            for part in html_parts:
+                f.write(part.encode("utf-8"))
             self.upload_file(f)
 
         self.set_progress(100)
         self.set_message("Done. Report uploaded.")
 
-    def _render_html(self, data: Dict[str, Any]) -> str:
+    def _render_html(self, data: Dict[str, Any]) -> Tuple[str, str, str]:
+        """
+        Return the report as (head, data_json, tail) so the caller can write each part in turn.
+        """
         # Embed data as JSON so the report is one file
-        data_json = json.dumps(data, ensure_ascii=False)
+        data_json = json.dumps(data, ensure_ascii=False, separators=(",", ":")).translate(
+            _JSON_SCRIPT_ESCAPES
+        )
         run = data["run"]
         meta = data["meta"]
         demo_mode = str(run.get("uuid", "")).startswith("demo")
@@ -763,12 +1066,29 @@ class EntityBrief(AddOn):
   </div>"""
 
         # The report should be self-contained (no external JS/CSS fetches on view).
-        return f"""<!doctype html>
+        fields = {
+            "run_uuid": _escape(run["uuid"]),
+            "version": run["version"],  # ADDON_VERSION constant
+            "docs_processed": run["docs_processed"],
+            "entity_docs": run.get("entity_docs", 0),
+            "pages_processed": run["pages_processed"],
+            "unique_entities": run["unique_entities"],
+            "runtime_seconds": run["runtime_seconds"],
+            "coverage_warning_block": coverage_warning_block,
+            "coverage_preview_block": coverage_preview_block,
+            "demo_chart_fallback": demo_chart_fallback,
+            "demo_index_fallback": demo_index_fallback,
+        }
+        return _HTML_HEAD.format_map(fields), data_json, _HTML_TAIL.format_map(fields)
+
+
+# Report shell for _render_html(); literal CSS/JS braces are doubled for str.format_map.
+_HTML_TEMPLATE = """<!doctype html>
 <html lang="en">
 <head>
   <meta charset="utf-8" />
   <meta name="viewport" content="width=device-width,initial-scale=1" />
-  <title>Entity Brief - {html.escape(run["uuid"])}</title>
+  <title>Entity Brief - {run_uuid}</title>
   <style>
     body {{ font-family: system-ui, -apple-system, Segoe UI, Roboto, sans-serif; margin: 24px; line-height: 1.4; }}
     .muted {{ color: #555; }}
@@ -802,13 +1122,13 @@ class EntityBrief(AddOn):
   <div class="card">
     <h2>Run Certificate</h2>
     <p class="small">
-      <strong>Run UUID:</strong> <code id="runUuid">{_escape(run["uuid"])}</code><br/>
-      <strong>Version:</strong> <code>{_escape(run["version"])}</code><br/>
-      <strong>Docs processed:</strong> {run["docs_processed"]} &nbsp; | &nbsp;
-      <strong>Docs with entities:</strong> {run.get("entity_docs", 0)} &nbsp; | &nbsp;
-      <strong>Pages processed:</strong> {run["pages_processed"]} &nbsp; | &nbsp;
-      <strong>Unique entities:</strong> {run["unique_entities"]} &nbsp; | &nbsp;
-      <strong>Runtime:</strong> {run["runtime_seconds"]}s
+      <strong>Run UUID:</strong> <code id="runUuid">{run_uuid}</code><br/>
+      <strong>Version:</strong> <code>{version}</code><br/>
+      <strong>Docs processed:</strong> {docs_processed} &nbsp; | &nbsp;
+      <strong>Docs with entities:</strong> {entity_docs} &nbsp; | &nbsp;
+      <strong>Pages processed:</strong> {pages_processed} &nbsp; | &nbsp;
+      <strong>Unique entities:</strong> {unique_entities} &nbsp; | &nbsp;
+      <strong>Runtime:</strong> {runtime_seconds}s
     </p>
 
     <div class="row">
@@ -1013,20 +1333,24 @@ class EntityBrief(AddOn):
     <div id="failures"></div>
   </div>
 
-  <script id="data" type="application/json">{html.escape(data_json)}</script>
+  <script id="data" type="application/json">{data_json}</script>
   <script>
     const DATA = JSON.parse(document.getElementById("data").textContent);
 
+    // Most names, titles, and counts have nothing to escape; test once before replacing.
+    const HTML_SPECIAL = /[&<>"']/;
+    const HTML_SPECIAL_ALL = /[&<>"']/g;
+    const HTML_ESCAPES = {{"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}};
+
     function escapeHtml(value) {{
       if (value === null || value === undefined) {{
         return "";
       }}
-      return String(value)
-        .replace(/&/g, "&amp;")
-        .replace(/</g, "&lt;")
-        .replace(/>/g, "&gt;")
-        .replace(/\"/g, "&quot;")
-        .replace(/'/g, "&#39;");
+      const str = String(value);
+      if (!HTML_SPECIAL.test(str)) {{
+        return str;
+      }}
+      return str.replace(HTML_SPECIAL_ALL, ch => HTML_ESCAPES[ch]);
     }}
 
     function safeUrl(value) {{
@@ -1255,10 +1579,22 @@ class EntityBrief(AddOn):
     let currentEntities = ENTITIES.slice();
     let currentEdges = EDGES.slice();
 
+    // One collator shared by every name sort.
+    const NAME_COLLATOR = new Intl.Collator();
+
     function normalizeTerm(value) {{
       return String(value || "").toLowerCase().trim();
     }}
 
+    // Names and aliases normalized once for filtering, index-aligned with ENTITIES.
+    const ENTITY_NAME_TERMS = ENTITIES.map(ent => normalizeTerm(ent.name));
+    const ENTITY_ALIAS_TERMS = ENTITIES.map(ent => (ent.aliases || []).map(normalizeTerm));
+    const ENTITY_SEARCH_TEXT = ENTITIES.map((ent, i) => [ENTITY_NAME_TERMS[i], ...ENTITY_ALIAS_TERMS[i]].join(" "));
+
+    function escapeRegExp(term) {{
+      return term.replace(/[.*+?^${{}}()|[\\]\\\\]/g, "\\\\$&");
+    }}
+
     function parseStoplist(text) {{
       const terms = String(text || "")
         .split(/[,\\n]/)
@@ -1268,19 +1604,17 @@ class EntityBrief(AddOn):
       return new Set(terms);
     }}
 
+    const CSV_SPECIAL = /[",\\n]/;
+
     function csvEscape(value) {{
       const str = value === null || value === undefined ? "" : String(value);
       // Escape CSV fields that include quotes, commas, or real newlines.
-      if (str.includes('"') || str.includes(",") || str.includes("\\n")) {{
+      if (CSV_SPECIAL.test(str)) {{
         return `"${{str.replace(/"/g, '""')}}"`;
       }}
       return str;
     }}
 
-    function toCsv(rows) {{
-      return rows.map(row => row.map(csvEscape).join(",")).join("\\n");
-    }}
-
     function downloadText(filename, text) {{
       const blob = new Blob([text], {{type: "text/plain"}});
       const url = URL.createObjectURL(blob);
@@ -1294,64 +1628,55 @@ class EntityBrief(AddOn):
     }}
 
     function buildEntityIndexCsv(entities) {{
-      const rows = [[
-        "entity_name",
-        "entity_kind",
-        "entity_doc_count",
-        "entity_total_mentions",
-        "doc_id",
-        "doc_title",
-        "doc_url",
-        "doc_pages",
-        "doc_mentions"
-      ]];
+      const lines = [
+        "entity_name,entity_kind,entity_doc_count,entity_total_mentions,doc_id,doc_title,doc_url,doc_pages,doc_mentions"
+      ];
       for (const ent of entities) {{
+        // The entity columns repeat on every doc row; escape them once.
+        const head = `${{csvEscape(ent.name)}},${{csvEscape(ent.kind)}},${{csvEscape(ent.doc_count)}},${{csvEscape(ent.total_mentions)}}`;
         const docs = ent.docs || [];
         if (!docs.length) {{
-          rows.push([ent.name, ent.kind, ent.doc_count, ent.total_mentions, "", "", "", "", ""]);
+          lines.push(`${{head}},,,,,`);
           continue;
         }}
         for (const doc of docs) {{
           const pages = (doc.pages || []).join(";");
-          rows.push([
-            ent.name,
-            ent.kind,
-            ent.doc_count,
-            ent.total_mentions,
-            doc.doc_id || "",
-            doc.title || "",
-            doc.url || "",
-            pages,
-            doc.count || ""
-          ]);
+          lines.push(
+            `${{head}},${{csvEscape(doc.doc_id || "")}},${{csvEscape(doc.title || "")}},${{csvEscape(doc.url || "")}},` +
+            `${{csvEscape(pages)}},${{csvEscape(doc.count || "")}}`
+          );
         }}
       }}
-      return toCsv(rows);
+      return lines.join("\\n");
     }}
 
     function buildConnectionsCsv(edges) {{
-      const rows = [[
-        "entity_a",
-        "entity_b",
-        "doc_count",
-        "page_count",
-        "example_pages"
-      ]];
+      const lines = ["entity_a,entity_b,doc_count,page_count,example_pages"];
       for (const edge of edges) {{
         const examples = (edge.examples || []).map(ex => {{
           const title = ex.title || `Document ${{ex.doc_id || ""}}`;
           const page = ex.page !== undefined ? `p${{ex.page}}` : "";
           return `${{title}} ${{page}}`.trim();
         }}).join(" | ");
-        rows.push([
-          edge.a,
-          edge.b,
-          edge.doc_count || "",
-          edge.page_count || "",
-          examples
-        ]);
+        lines.push(
+          `${{csvEscape(edge.a)}},${{csvEscape(edge.b)}},${{csvEscape(edge.doc_count || "")}},` +
+          `${{csvEscape(edge.page_count || "")}},${{csvEscape(examples)}}`
+        );
+      }}
+      return lines.join("\\n");
+    }}
+
+    // The chart's size comes from static attributes; read them once.
+    let chartSize = null;
+    const CHART_MARGIN = {{top: 20, right: 20, bottom: 120, left: 60}};
+    const SVG_NS = "http://www.w3.org/2000/svg";
+
+    function svgEl(name, attrs) {{
+      const el = document.createElementNS(SVG_NS, name);
+      for (const [k, v] of Object.entries(attrs || {{}})) {{
+        el.setAttribute(k, String(v));
       }}
-      return toCsv(rows);
+      return el;
     }}
 
     function renderChart(entities) {{
@@ -1360,12 +1685,13 @@ class EntityBrief(AddOn):
       if (!chartSvg) {{
         return;
       }}
-      const top = entities.slice(0, 15).map(d => ({{
-        name: d.name,
-        kind: d.kind,
-        doc_count: d.doc_count,
-        total_mentions: d.total_mentions
-      }}));
+      if (!chartSize) {{
+        chartSize = {{
+          width: parseInt(chartSvg.getAttribute("width") || "900", 10),
+          height: parseInt(chartSvg.getAttribute("height") || "380", 10)
+        }};
+      }}
+      const top = entities.slice(0, 15);
 
       const existingNote = document.getElementById("chartNote");
       if (existingNote) {{
@@ -1390,24 +1716,14 @@ class EntityBrief(AddOn):
         demoChartFallback.style.display = "none";
       }}
 
-      const ns = "http://www.w3.org/2000/svg";
-      function svgEl(name, attrs) {{
-        const el = document.createElementNS(ns, name);
-        for (const [k, v] of Object.entries(attrs || {{}})) {{
-          el.setAttribute(k, String(v));
-        }}
-        return el;
-      }}
-
-      const width = parseInt(chartSvg.getAttribute("width") || "900", 10);
-      const height = parseInt(chartSvg.getAttribute("height") || "380", 10);
-      const margin = {{top: 20, right: 20, bottom: 120, left: 60}};
+      const {{width, height}} = chartSize;
+      const margin = CHART_MARGIN;
       const innerW = Math.max(10, width - margin.left - margin.right);
       const innerH = Math.max(10, height - margin.top - margin.bottom);
       const maxVal = Math.max(...top.map(d => d.doc_count || 0), 1);
 
+      // Build the chart detached and attach it once at the end.
       const g = svgEl("g", {{transform: `translate(${{margin.left}},${{margin.top}})`}});
-      chartSvg.appendChild(g);
 
       // Y axis + light grid.
       const ticks = 6;
@@ -1448,8 +1764,28 @@ class EntityBrief(AddOn):
         text.appendChild(title);
         g.appendChild(text);
       }});
+      chartSvg.appendChild(g);
+    }}
+
+    function textOf(value) {{
+      return value === null || value === undefined ? "" : String(value);
+    }}
+
+    function linkEl(href, text) {{
+      // href comes from safeUrl()/docPageUrl(); the DOM handles attribute and text escaping.
+      const a = document.createElement("a");
+      a.href = href;
+      a.target = "_blank";
+      a.rel = "noreferrer";
+      a.textContent = text;
+      return a;
     }}
 
+    // Row/card skeletons are built once and cloned per item; plain fields are set with
+    // textContent and the whole list is attached in one go, so there is one reflow per render.
+    let connTableProto = null;
+    let connRowProto = null;
+
     function renderConnections(edges) {{
       const connDiv = document.getElementById("connections");
       if (!connDiv) {{
@@ -1460,24 +1796,104 @@ class EntityBrief(AddOn):
         connDiv.innerHTML = "<p class='muted small'>No connections computed (or not enough entities).</p>";
         return;
       }}
-      let html = "<table><thead><tr><th>Entity A</th><th>Entity B</th><th>Docs</th><th>Pages</th><th>Example pages</th></tr></thead><tbody>";
+      if (!connTableProto) {{
+        connTableProto = document.createElement("table");
+        const thead = document.createElement("thead");
+        thead.innerHTML = "<tr><th>Entity A</th><th>Entity B</th><th>Docs</th><th>Pages</th><th>Example pages</th></tr>";
+        connTableProto.appendChild(thead);
+        connRowProto = document.createElement("tr");
+        for (let i = 0; i < 5; i++) {{
+          connRowProto.appendChild(document.createElement("td"));
+        }}
+      }}
+      const table = connTableProto.cloneNode(true);
+      const tbody = document.createElement("tbody");
       for (const e of displayEdges) {{
-        const examples = (e.examples || []).map(ex => {{
-          const title = escapeHtml(ex.title || `Document ${{ex.doc_id || ""}}`);
+        const row = connRowProto.cloneNode(true);
+        const cells = row.children;
+        cells[0].textContent = textOf(e.a);
+        cells[1].textContent = textOf(e.b);
+        cells[2].textContent = textOf(e.doc_count);
+        cells[3].textContent = textOf(e.page_count || "");
+        const examples = e.examples || [];
+        examples.forEach((ex, i) => {{
+          if (i) {{
+            cells[4].appendChild(document.createElement("br"));
+          }}
+          const title = textOf(ex.title || `Document ${{ex.doc_id || ""}}`);
           const url = safeUrl(ex.url);
-          const pageLabel = ex.page !== undefined ? `p${{escapeHtml(ex.page)}}` : "";
+          const pageLabel = ex.page !== undefined ? `p${{textOf(ex.page)}}` : "";
           if (url && ex.page !== undefined) {{
-            return `<a href="${{escapeHtml(docPageUrl(url, ex.page))}}" target="_blank" rel="noreferrer">${{title}} (${{pageLabel}})</a>`;
+            cells[4].appendChild(linkEl(docPageUrl(url, ex.page), `${{title}} (${{pageLabel}})`));
+            return;
           }}
-          if (url) {{
-            return `<a href="${{escapeHtml(url)}}" target="_blank" rel="noreferrer">${{title}}</a>${{pageLabel ? " (" + pageLabel + ")" : ""}}`;
+          cells[4].append(url ? linkEl(url, title) : title);
+          if (pageLabel) {{
+            cells[4].append(` (${{pageLabel}})`);
+          }}
+        }});
+        if (!examples.length) {{
+          cells[4].textContent = "-";
+        }}
+        tbody.appendChild(row);
+      }}
+      table.appendChild(tbody);
+      connDiv.replaceChildren(table);
+    }}
+
+    let entityCardProto = null;
+
+    function entityCardSkeleton() {{
+      // <details class="card">
+      //   <summary><strong>name</strong> <span class="muted">(kind)</span> - docs: <strong>n</strong>, mentions: <strong>n</strong></summary>
+      //   <div class="small muted">Aliases (sample): ...</div>
+      //   <div style="margin-top:8px;">doc lines</div>
+      // </details>
+      const details = document.createElement("details");
+      details.className = "card";
+      const summary = document.createElement("summary");
+      const kind = document.createElement("span");
+      kind.className = "muted";
+      summary.append(
+        document.createElement("strong"), " ", kind,
+        " - docs: ", document.createElement("strong"),
+        ", mentions: ", document.createElement("strong")
+      );
+      const aliases = document.createElement("div");
+      aliases.className = "small muted";
+      const docs = document.createElement("div");
+      docs.setAttribute("style", "margin-top:8px;");
+      details.append(summary, aliases, docs);
+      return details;
+    }}
+
+    function entityDocLine(d) {{
+      // <div class="small"><strong>doc link</strong> - mentions: n - pages: p1, p2<div>...sample...</div></div>
+      const url = safeUrl(d.url);
+      const title = textOf(d.title || `Document ${{d.doc_id || ""}}`);
+      const line = document.createElement("div");
+      line.className = "small";
+      const strong = document.createElement("strong");
+      strong.append(url ? linkEl(url, title) : title);
+      line.append(strong, ` - mentions: ${{textOf(d.count)}}`);
+      const pages = d.pages || [];
+      if (pages.length) {{
+        line.append(" - pages: ");
+        pages.forEach((p, i) => {{
+          if (i) {{
+            line.append(", ");
           }}
-          return `${{title}}${{pageLabel ? " (" + pageLabel + ")" : ""}}`;
-        }}).join("<br/>");
-        html += `<tr><td>${{escapeHtml(e.a)}}</td><td>${{escapeHtml(e.b)}}</td><td>${{escapeHtml(e.doc_count)}}</td><td>${{escapeHtml(e.page_count || "")}}</td><td>${{examples || "-"}}</td></tr>`;
+          const label = `p${{textOf(p)}}`;
+          line.append(url ? linkEl(docPageUrl(url, p), label) : label);
+        }});
       }}
-      html += "</tbody></table>";
-      connDiv.innerHTML = html;
+      for (const s of (d.samples || []).slice(0, 2)) {{
+        const sample = document.createElement("div");
+        sample.className = "muted small";
+        sample.textContent = `...${{textOf(s)}}...`;
+        line.appendChild(sample);
+      }}
+      return line;
     }}
 
     function renderEntityIndex(entities) {{
@@ -1489,30 +1905,32 @@ class EntityBrief(AddOn):
       if (!displayEntities.length) {{
         idx.innerHTML = "<p class='muted small'>No entities to display.</p>";
       }} else {{
-        idx.innerHTML = displayEntities.map(ent => {{
-          const docs = (ent.docs || []).map(d => {{
-            const url = safeUrl(d.url);
-            const title = escapeHtml(d.title || `Document ${{d.doc_id || ""}}`);
-            const link = url ? `<a href="${{escapeHtml(url)}}" target="_blank" rel="noreferrer">${{title}}</a>` : title;
-            const pages = (d.pages || []).map(p => {{
-              const label = `p${{escapeHtml(p)}}`;
-              if (url) {{
-                return `<a href="${{escapeHtml(docPageUrl(url, p))}}" target="_blank" rel="noreferrer">${{label}}</a>`;
-              }}
-              return label;
-            }}).join(", ");
-            const samples = (d.samples || []).slice(0, 2).map(s => `<div class="muted small">...${{escapeHtml(s)}}...</div>`).join("");
-            return `<div class="small"><strong>${{link}}</strong> - mentions: ${{escapeHtml(d.count)}}${{pages ? " - pages: " + pages : ""}}${{samples}}</div>`;
-          }}).join("");
-          const aliases = (ent.aliases || []).slice(0, 10).map(a => escapeHtml(a)).join(", ");
-          return `
-            <details class="card">
-              <summary><strong>${{escapeHtml(ent.name)}}</strong> <span class="muted">(${{escapeHtml(ent.kind)}})</span> - docs: <strong>${{escapeHtml(ent.doc_count)}}</strong>, mentions: <strong>${{escapeHtml(ent.total_mentions)}}</strong></summary>
-              <div class="small muted">Aliases (sample): ${{aliases}}</div>
-              <div style="margin-top:8px;">${{docs || "<div class='muted small'>No doc details</div>"}}</div>
-            </details>
-          `;
-        }}).join("");
+        if (!entityCardProto) {{
+          entityCardProto = entityCardSkeleton();
+        }}
+        const frag = document.createDocumentFragment();
+        for (const ent of displayEntities) {{
+          const card = entityCardProto.cloneNode(true);
+          const [summary, aliasesDiv, docsDiv] = card.children;
+          const [nameEl, kindEl, docCountEl, mentionsEl] = summary.children;
+          nameEl.textContent = textOf(ent.name);
+          kindEl.textContent = `(${{textOf(ent.kind)}})`;
+          docCountEl.textContent = textOf(ent.doc_count);
+          mentionsEl.textContent = textOf(ent.total_mentions);
+          aliasesDiv.textContent = "Aliases (sample): " + (ent.aliases || []).slice(0, 10).map(textOf).join(", ");
+          const docs = ent.docs || [];
+          for (const d of docs) {{
+            docsDiv.appendChild(entityDocLine(d));
+          }}
+          if (!docs.length) {{
+            const none = document.createElement("div");
+            none.className = "muted small";
+            none.textContent = "No doc details";
+            docsDiv.appendChild(none);
+          }}
+          frag.appendChild(card);
+        }}
+        idx.replaceChildren(frag);
       }}
       if (demoIndexFallback) {{
         demoIndexFallback.style.display = "none";
@@ -1630,27 +2048,26 @@ class EntityBrief(AddOn):
       const minDocs = coverageFilter ? parseInt(coverageFilter.value || "1", 10) : 1;
       const stoplist = parseStoplist(stoplistInput ? stoplistInput.value : "");
       const stopTerms = Array.from(stoplist);
+      const stopRe = stopTerms.length ? new RegExp(stopTerms.map(escapeRegExp).join("|")) : null;
       const sortValue = sortBy ? sortBy.value : "doc_count";
 
-      currentEntities = ENTITIES.filter(ent => {{
+      currentEntities = ENTITIES.filter((ent, i) => {{
         if (kindValue !== "All" && ent.kind !== kindValue) {{
           return false;
         }}
         if (ent.doc_count < minDocs) {{
           return false;
         }}
-        if (stopTerms.length) {{
-          const name = normalizeTerm(ent.name);
-          if (stopTerms.some(term => name.includes(term))) {{
+        if (stopRe) {{
+          if (stopRe.test(ENTITY_NAME_TERMS[i])) {{
             return false;
           }}
-          const aliases = (ent.aliases || []).map(normalizeTerm);
-          if (aliases.some(alias => stopTerms.some(term => alias.includes(term)))) {{
+          if (ENTITY_ALIAS_TERMS[i].some(alias => stopRe.test(alias))) {{
             return false;
           }}
         }}
         if (searchTerms.length) {{
-          const haystack = [normalizeTerm(ent.name), ...(ent.aliases || []).map(normalizeTerm)].join(" ");
+          const haystack = ENTITY_SEARCH_TEXT[i];
           if (!searchTerms.every(term => haystack.includes(term))) {{
             return false;
           }}
@@ -1660,30 +2077,42 @@ class EntityBrief(AddOn):
 
       currentEntities.sort((a, b) => {{
         if (sortValue === "total_mentions") {{
-          return (b.total_mentions - a.total_mentions) || (b.doc_count - a.doc_count) || a.name.localeCompare(b.name);
+          return (b.total_mentions - a.total_mentions) || (b.doc_count - a.doc_count) || NAME_COLLATOR.compare(a.name, b.name);
         }}
         if (sortValue === "name") {{
-          return a.name.localeCompare(b.name);
+          return NAME_COLLATOR.compare(a.name, b.name);
         }}
-        return (b.doc_count - a.doc_count) || (b.total_mentions - a.total_mentions) || a.name.localeCompare(b.name);
+        return (b.doc_count - a.doc_count) || (b.total_mentions - a.total_mentions) || NAME_COLLATOR.compare(a.name, b.name);
       }});
 
       const keySet = new Set(currentEntities.map(ent => ent.key));
       currentEdges = EDGES.filter(edge => keySet.has(edge.a_key) && keySet.has(edge.b_key));
       currentEdges.sort((a, b) => {{
-        return (b.page_count - a.page_count) || (b.doc_count - a.doc_count) || a.a.localeCompare(b.a);
+        return (b.page_count - a.page_count) || (b.doc_count - a.doc_count) || NAME_COLLATOR.compare(a.a, b.a);
       }});
 
-      renderChart(currentEntities);
-      renderConnections(currentEdges);
-      renderEntityIndex(currentEntities);
+      scheduleRender();
     }}
 
-    function initControls() {{
-      if (!kindFilter) {{
+    // Coalesce the three filtered views into one animation frame so repeated filter
+    // events (Enter, slider, buttons) cost at most one layout per frame.
+    let pendingFrame = 0;
+
+    function scheduleRender() {{
+      if (pendingFrame) {{
+        return;
+      }}
+      pendingFrame = requestAnimationFrame(() => {{
+        pendingFrame = 0;
         renderChart(currentEntities);
         renderConnections(currentEdges);
         renderEntityIndex(currentEntities);
+      }});
+    }}
+
+    function initControls() {{
+      if (!kindFilter) {{
+        scheduleRender();
         return;
       }}
       const kinds = Array.from(new Set(ENTITIES.map(ent => ent.kind))).sort();
@@ -1810,6 +2239,8 @@ class EntityBrief(AddOn):
 </body>
 </html>"""
 
+_HTML_HEAD, _HTML_TAIL = _HTML_TEMPLATE.split("{data_json}")
+
 
 if __name__ == "__main__":
     EntityBrief().main()
@@ -67,6 +67,7 @@ def build_docs(doc_ids: List[int], token: str) -> List[SimpleNamespace]:
                 title=info.get("title"),
                 canonical_url=info.get("canonical_url", ""),
                 page_count=info.get("page_count", 0),
+                updated_at=info.get("updated_at", ""),
             )
         )
     return docs